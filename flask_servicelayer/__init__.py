@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 '''
-    flask.ext.servicelayer
-    ----------------------
+    flask_servicelayer
+    ------------------
 
     This modules provides some classes to build a Service layer and expose
     an API that interacts with the model. The idea is to remove all
@@ -11,6 +11,15 @@
 '''
 
 import abc
+import base64
+import csv
+import datetime
+import json
+import re
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from itertools import islice
 from math import ceil
 
 from flask import abort
@@ -37,9 +46,237 @@ class ServiceFormError(Exception):
         self.errors = errors
 
 
+class ImportReport(object):
+    """
+        Summary of a bulk import. `errors` is a list of
+        `(index, record, exception)` tuples, `index` starting at 1. `record`
+        is None when the record could not be parsed.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.skipped + len(self.errors)
+
+    def add(self, status):
+        setattr(self, status, getattr(self, status) + 1)
+
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return {'$base64': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def _json_object_hook(obj):
+    if list(obj) == ['$base64']:
+        return base64.b64decode(obj['$base64'])
+    return obj
+
+
+def _write_jsonl(stream, records, fields, service):
+    for record in records:
+        stream.write(json.dumps(record, default=_json_default,
+                                sort_keys=True))
+        stream.write('\n')
+
+
+def _read_jsonl(stream, service):
+    """
+        Readers yield a `ServiceError` in place of a record that cannot be
+        parsed, so that the import reports it and goes on.
+    """
+    for lineno, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line, object_hook=_json_object_hook)
+        except ValueError as e:
+            yield ServiceError('Invalid JSON on line %d: %s' % (lineno, e))
+            continue
+        if not isinstance(record, dict):
+            yield ServiceError('Line %d is not a JSON object' % lineno)
+            continue
+        yield record
+
+
+def _csv_cell(value):
+    """
+        Multi-valued attributes are written as a JSON array. Other values
+        starting with '[' or '\\' are escaped with a leading '\\'.
+    """
+    if isinstance(value, list):
+        return json.dumps(value, default=_json_default)
+    value = str(value)
+    if value.startswith(('[', '\\')):
+        return '\\' + value
+    return value
+
+
+def _csv_value(cell):
+    if cell.startswith('['):
+        return json.loads(cell)
+    if cell.startswith('\\'):
+        return cell[1:]
+    return cell
+
+
+def _write_csv(stream, records, fields, service):
+    """
+        Binary values are not supported, use JSONL or LDIF instead.
+    """
+    writer = csv.DictWriter(stream, fieldnames=fields)
+    writer.writeheader()
+    for record in records:
+        for k, v in record.items():
+            if any(isinstance(i, bytes)
+                   for i in (v if isinstance(v, list) else [v])):
+                raise ValueError('CSV format does not support binary '
+                                 'attribute %s' % k)
+        writer.writerow({k: _csv_cell(v) for k, v in record.items()})
+
+
+def _read_csv(stream, service):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        try:
+            yield {k: _csv_value(v) for k, v in row.items() if v}
+        except ValueError as e:
+            yield ServiceError('Invalid CSV cell on line %d: %s'
+                               % (reader.line_num, e))
+
+
+def _ldif_safe(value):
+    return value and value[0] not in ' :<' and value[-1] != ' ' and \
+        all(32 <= ord(c) < 127 for c in value)
+
+
+def _write_ldif_line(stream, attr, value):
+    if not isinstance(value, bytes):
+        value = str(value)
+        if _ldif_safe(value):
+            stream.write('%s: %s\n' % (attr, value))
+            return
+        value = value.encode('utf-8')
+    stream.write('%s:: %s\n' % (attr, base64.b64encode(value).decode('ascii')))
+
+
+def _write_ldif(stream, records, fields, service):
+    """
+        Fields are written with the attribute names given by
+        `service._ldif_attrs()`.
+    """
+    attrs = service._ldif_attrs()
+    stream.write('version: 1\n')
+    for record in records:
+        stream.write('\n')
+        for attr, value in service._ldif_header(record):
+            _write_ldif_line(stream, attr, value)
+        for k in sorted(record):
+            v = record[k]
+            for value in (v if isinstance(v, list) else [v]):
+                _write_ldif_line(stream, attrs.get(k, k), value)
+
+
+def _read_ldif(stream, service):
+    """
+        Yields LDIF entries as dictionaries keyed by field name. The dn and
+        the objectClass are dropped: the importing service computes its own.
+    """
+    fields = {v.lower(): k for k, v in service._ldif_attrs().items()}
+    for lines in _ldif_blocks(stream):
+        try:
+            entry = _parse_ldif_entry(lines, fields)
+        except ValueError as e:
+            yield ServiceError('Invalid LDIF entry %s: %s' % (lines[0], e))
+            continue
+        if entry:
+            yield entry
+
+
+def _ldif_blocks(stream):
+    lines = []
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if line.startswith(' ') and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+        elif lines:
+            yield lines
+            lines = []
+    if lines:
+        yield lines
+
+
+def _parse_ldif_entry(lines, fields):
+    entry = {}
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        k, _, v = line.partition(':')
+        if v.startswith(':'):
+            v = base64.b64decode(v[1:].strip())
+            try:
+                v = v.decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+        else:
+            v = v.strip()
+        if k.lower() in ('version', 'dn', 'changetype', 'objectclass'):
+            continue
+        k = fields.get(k.lower(), k)
+        if k in entry:
+            if not isinstance(entry[k], list):
+                entry[k] = [entry[k]]
+            entry[k].append(v)
+        else:
+            entry[k] = v
+    return entry
+
+
+_FORMATS = {
+    'jsonl': (_read_jsonl, _write_jsonl),
+    'csv': (_read_csv, _write_csv),
+    'ldif': (_read_ldif, _write_ldif),
+}
+
+_ON_CONFLICT = ('error', 'skip', 'update')
+
+_COUNT = ('exact', 'approximate', None)
+
+
+def _parse_bool(value):
+    if value in ('True', 'true', '1'):
+        return True
+    if value in ('False', 'false', '0'):
+        return False
+    raise ValueError('%r is not a boolean' % value)
+
+
+_COERCIONS = {
+    int: int,
+    float: float,
+    bool: _parse_bool,
+    Decimal: Decimal,
+    datetime.date: datetime.date.fromisoformat,
+    datetime.datetime: datetime.datetime.fromisoformat,
+    datetime.time: datetime.time.fromisoformat,
+}
+
+
 class BaseService(object):
     __metaclass__ = abc.ABCMeta
     __model__ = None
+    __estimate_ttl__ = 300
+    __estimate_cache_size__ = 100
 
     def _isinstance(self, obj, raise_error=True):
         """
@@ -179,6 +416,244 @@ class BaseService(object):
             :param error_out: abort 404 if no items where found on the page?
         """
 
+    @abc.abstractmethod
+    def lazy_paginate(self, page=1, per_page=10, order_by=None, desc=False,
+                      filter_by={}, error_out=True, count='exact'):
+        """
+            Returns a `LazyPagination` object. Only `per_page+1` items are
+            fetched, the total is computed when it is first needed.
+
+            :param page: page to return
+            :param per_page: number of items in a page
+            :param order_by: model attribute used to order elements, default=id
+            :param desc: descendant sort, default=False
+            :param filter_by: filter parameters
+            :param error_out: abort 404 if no items where found on the page?
+            :param count: 'exact', 'approximate' or None to never count
+        """
+
+    def _lazy_paginate(self, page, per_page, filter_by, error_out, count,
+                       fetch, total, estimate=None):
+        """
+            Returns the `LazyPagination` object of `lazy_paginate()`.
+            Backends only provide the way to fetch and count the items.
+
+            :param fetch: callable returning `limit` items from `offset`
+            :param total: callable returning the exact number of items
+            :param estimate: callable returning an approximate number of
+                             items, default=total
+        """
+        if count not in _COUNT:
+            raise ValueError("count must be 'exact', 'approximate' or None")
+        if error_out and page < 1:
+            abort(404)
+        items = fetch((page - 1) * per_page, per_page + 1)
+        if error_out and page != 1 and not items:
+            abort(404)
+        if count == 'exact':
+            return LazyPagination(page, per_page, items, count=total)
+        if count == 'approximate':
+            estimate = self._cached_estimate(filter_by, estimate or total)
+            return LazyPagination(page, per_page, items, estimate=estimate)
+        return LazyPagination(page, per_page, items)
+
+    def _cached_estimate(self, filter_by, estimate):
+        """
+            Returns a callable computing `estimate()`, cached per filter for
+            `__estimate_ttl__` seconds. Only the `__estimate_cache_size__`
+            most recently used filters are kept.
+
+            :param filter_by: filter parameters
+            :param estimate: callable returning an approximate count
+        """
+        key = tuple(sorted(
+            (k, tuple(v) if isinstance(v, list) else
+             frozenset(v) if isinstance(v, set) else v)
+            for k, v in filter_by.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return estimate
+
+        def cached():
+            cache = self.__dict__.setdefault('_estimate_cache', OrderedDict())
+            now = time.monotonic()
+            entry = cache.pop(key, None)
+            if entry is None or now - entry[1] >= self.__estimate_ttl__:
+                entry = (estimate(), now)
+            cache[key] = entry
+            while len(cache) > self.__estimate_cache_size__:
+                cache.popitem(last=False)
+            return entry[0]
+        return cached
+
+    @abc.abstractmethod
+    def _fields(self):
+        """
+            Returns the names of the model attributes exported by default.
+        """
+
+    @abc.abstractmethod
+    def _key_field(self):
+        """
+            Returns the name of the field identifying an instance.
+        """
+
+    def _iter_objects(self, batch_size):
+        """
+            Returns an iterator over all instances of the service's model.
+            Backends should override it to avoid loading everything at once.
+
+            :param batch_size: number of instances to fetch at once
+        """
+        return iter(self.all())
+
+    @abc.abstractmethod
+    def _lookup(self, record):
+        """
+            Returns the existing instance matching the record, or None.
+
+            :param record: a dictionary of parameters
+        """
+
+    def _ldif_attrs(self):
+        """
+            Returns a dictionary mapping field names to LDIF attribute names.
+        """
+        return {field: field for field in self._fields()}
+
+    def _ldif_header(self, record):
+        """
+            Returns the `(attribute, value)` lines starting the LDIF entry of
+            a record, the dn first.
+
+            :param record: a dictionary of parameters
+        """
+        key = self._key_field()
+        return [('dn', '%s=%s' % (key, record[key]))]
+
+    def _import_record(self, record, on_conflict, existing):
+        """
+            Creates or updates the instance described by the record and
+            returns 'created', 'updated' or 'skipped'.
+
+            :param record: a dictionary of parameters
+            :param on_conflict: 'error', 'skip' or 'update'
+            :param existing: the instance matching the record, or None
+        """
+        if existing is None:
+            self.create(**record)
+            return 'created'
+        if on_conflict == 'skip':
+            return 'skipped'
+        if on_conflict == 'update':
+            self.update(existing, **record)
+            return 'updated'
+        raise ServiceError('%s already exists' % existing)
+
+    def _write_batch(self, batch, on_conflict, report):
+        """
+            Imports a batch of `(index, record)` tuples, one write per record
+            by default. Errors are recorded in the report.
+
+            :param batch: a list of `(index, record)` tuples
+            :param on_conflict: 'error', 'skip' or 'update'
+            :param report: the `ImportReport` to fill
+        """
+        for index, record in batch:
+            try:
+                report.add(self._import_record(dict(record), on_conflict,
+                                               self._lookup(record)))
+            except Exception as e:
+                report.errors.append((index, record, e))
+
+    def export_records(self, fields=None, batch_size=100):
+        """
+            Returns a generator of dictionaries, one for each instance of the
+            service's model. It can be given to `import_records()` of another
+            service to copy data between backends.
+
+            :param fields: names of the attributes to export
+            :param batch_size: number of instances to fetch at once
+        """
+        fields = fields or self._fields()
+        for obj in self._iter_objects(batch_size):
+            record = {}
+            for field in fields:
+                value = getattr(obj, field, None)
+                if value is None or value == set():
+                    continue
+                if isinstance(value, (set, frozenset)):
+                    value = sorted(value)
+                record[field] = value
+            yield record
+
+    def export(self, stream, format='jsonl', fields=None, batch_size=100):
+        """
+            Writes all instances of the service's model to a text stream.
+
+            :param stream: a file-like object opened in text mode
+            :param format: 'jsonl', 'csv' or 'ldif'
+            :param fields: names of the attributes to export
+            :param batch_size: number of instances to fetch at once
+        """
+        if format not in _FORMATS:
+            raise ValueError('Unknown format %s' % format)
+        fields = fields or self._fields()
+        if format == 'ldif' and self._key_field() not in fields:
+            raise ValueError('LDIF export needs the %s field'
+                             % self._key_field())
+        _FORMATS[format][1](stream, self.export_records(fields, batch_size),
+                            fields, self)
+
+    def import_records(self, records, batch_size=100, on_conflict='error',
+                       progress=None):
+        """
+            Creates instances of the service's model from an iterable of
+            dictionaries, `batch_size` records at a time. Errors do not stop
+            the import, they are collected in the returned `ImportReport`.
+
+            :param records: an iterable of dictionaries
+            :param batch_size: number of records written at once
+            :param on_conflict: 'error', 'skip' or 'update' existing instances
+            :param progress: callable called with the report after each batch
+        """
+        if on_conflict not in _ON_CONFLICT:
+            raise ValueError('on_conflict must be one of %s'
+                             % ', '.join(_ON_CONFLICT))
+        report = ImportReport()
+        records = enumerate(records, 1)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            for index, record in batch:
+                if isinstance(record, Exception):
+                    report.errors.append((index, None, record))
+            self._write_batch([(index, record) for index, record in batch
+                               if not isinstance(record, Exception)],
+                              on_conflict, report)
+            if progress:
+                progress(report)
+        return report
+
+    def import_(self, stream, format='jsonl', batch_size=100,
+                on_conflict='error', progress=None):
+        """
+            Creates instances of the service's model from a text stream
+            written by `export()`.
+
+            :param stream: a file-like object opened in text mode
+            :param format: 'jsonl', 'csv' or 'ldif'
+            :param batch_size: number of records written at once
+            :param on_conflict: 'error', 'skip' or 'update' existing instances
+            :param progress: callable called with the report after each batch
+        """
+        if format not in _FORMATS:
+            raise ValueError('Unknown format %s' % format)
+        return self.import_records(_FORMATS[format][0](stream, self),
+                                   batch_size, on_conflict, progress)
+
 
 class SQLAlchemyService(BaseService):
     """
@@ -242,6 +717,164 @@ class SQLAlchemyService(BaseService):
         return self.__model__.query.filter_by(**filter_by).order_by(order_by)\
             .paginate(page, per_page, error_out)
 
+    def _estimate_count(self, query):
+        """
+            Returns the planner estimate of the number of rows returned by the
+            query on PostgreSQL, and an exact count on other databases.
+        """
+        query = query.order_by(None)
+        connection = self.__db__.session.connection()
+        if connection.dialect.name != 'postgresql':
+            return query.count()
+        compiled = query.statement.compile(dialect=connection.dialect)
+        params = compiled.params
+        if compiled.positional:
+            params = tuple(params[name] for name in compiled.positiontup)
+        plan = connection.exec_driver_sql('EXPLAIN %s' % compiled,
+                                          params).scalar()
+        return int(re.search(r'rows=(\d+)', plan).group(1))
+
+    def lazy_paginate(self, page=1, per_page=10, order_by=None, desc=False,
+                      filter_by={}, error_out=True, count='exact'):
+        order_by = order_by or self.__model__.id
+        order_by = order_by.desc() if desc else order_by.asc()
+        query = self.__model__.query.filter_by(**filter_by)
+
+        def fetch(offset, limit):
+            return query.order_by(order_by).limit(limit).offset(offset).all()
+        return self._lazy_paginate(page, per_page, filter_by, error_out,
+                                   count, fetch, query.order_by(None).count,
+                                   lambda: self._estimate_count(query))
+
+    def _fields(self):
+        return [attr.key for attr in self.__model__.__mapper__.column_attrs]
+
+    def _key_field(self):
+        return 'id'
+
+    def _iter_objects(self, batch_size):
+        """
+            Pages through the table by id, `batch_size` rows per query, so
+            that no cursor stays open while the records are consumed: an
+            import fed by this export can commit in between.
+        """
+        query = self.__model__.query.order_by(self.__model__.id)
+        objects = query.limit(batch_size).all()
+        while objects:
+            for obj in objects:
+                yield obj
+            objects = query.filter(self.__model__.id > objects[-1].id)\
+                .limit(batch_size).all()
+
+    def _lookup(self, record):
+        if record.get('id') is None:
+            return None
+        return self.get(record['id'])
+
+    def _lookup_batch(self, records):
+        """
+            Returns the existing instances matching the records, in the same
+            order. Uses one query as long as `_lookup()` is the default id
+            lookup, and calls the overriding `_lookup()` for each record
+            otherwise.
+
+            :param records: a list of dictionaries
+        """
+        if type(self)._lookup is not SQLAlchemyService._lookup:
+            return [self._lookup(record) for record in records]
+        ids = [record['id'] for record in records
+               if record.get('id') is not None]
+        existing = {obj.id: obj for obj in self.get_all(*ids)} if ids \
+            else {}
+        return [existing.get(record.get('id')) for record in records]
+
+    def _coerce(self, record):
+        """
+            Returns a copy of the record with string values converted to the
+            Python type of their column, as CSV and LDIF only carry strings.
+
+            :param record: a dictionary of parameters
+        """
+        columns = {attr.key: attr.columns[0]
+                   for attr in self.__model__.__mapper__.column_attrs}
+        record = dict(record)
+        for k, v in record.items():
+            if k not in columns or not isinstance(v, str):
+                continue
+            try:
+                python_type = columns[k].type.python_type
+            except NotImplementedError:
+                continue
+            if python_type in _COERCIONS:
+                record[k] = _COERCIONS[python_type](v)
+        return record
+
+    def _import_record(self, record, on_conflict, existing):
+        """
+            Same as `BaseService._import_record()`, but the instance is only
+            added to the session: `_write_batch()` commits the whole batch.
+        """
+        if existing is not None and on_conflict != 'update':
+            return super()._import_record(record, on_conflict, existing)
+        if existing is None:
+            obj = self.new(**record)
+        else:
+            obj = existing
+            for k, v in self._preprocess_params(record).items():
+                setattr(obj, k, v)
+        self._isinstance(obj)
+        self.__db__.session.add(obj)
+        return 'created' if existing is None else 'updated'
+
+    def _write_batch(self, batch, on_conflict, report):
+        """
+            Looks up the existing instances of the batch with
+            `_lookup_batch()`, then adds all the records and commits them with
+            a single flush. If that fails, the batch is written again with one
+            savepoint per record, so that only the failing records are rolled
+            back.
+
+            On SQLite, savepoints need the pysqlite workaround described in
+            the SQLAlchemy documentation ("Serializable isolation /
+            Savepoints / Transactional DDL").
+        """
+        session = self.__db__.session
+        records = []
+        for index, record in batch:
+            try:
+                records.append((index, record, self._coerce(record)))
+            except Exception as e:
+                report.errors.append((index, record, e))
+        try:
+            existing = self._lookup_batch(
+                [values for _, _, values in records])
+            results = []
+            for (index, record, values), obj in zip(records, existing):
+                try:
+                    result = self._import_record(dict(values), on_conflict,
+                                                 obj)
+                except Exception as e:
+                    result = e
+                results.append((index, record, result))
+            session.commit()
+        except Exception:
+            session.rollback()
+            results = []
+            for index, record, values in records:
+                try:
+                    with session.begin_nested():
+                        result = self._import_record(
+                            dict(values), on_conflict, self._lookup(values))
+                except Exception as e:
+                    result = e
+                results.append((index, record, result))
+            session.commit()
+        for index, record, result in results:
+            if isinstance(result, Exception):
+                report.errors.append((index, record, result))
+            else:
+                report.add(result)
+
 
 class LDAPOMService(BaseService):
     """
@@ -336,6 +969,47 @@ class LDAPOMService(BaseService):
         objects = objects[(page-1)*per_page:page*per_page]
         return Pagination(page, per_page, total, objects)
 
+    def lazy_paginate(self, page=1, per_page=10, order_by=None, desc=False,
+                      filter_by={}, error_out=True, count='exact'):
+        """
+            LDAP has no server-side count, so counting loads all the matching
+            entries. Approximate counts are cached within the service object.
+        """
+        def fetch(offset, limit):
+            objects = self.__model__.search(self.__ldap__, **filter_by)
+            return list(islice(objects, offset, offset + limit))
+
+        def total():
+            return len(self.find(**filter_by))
+        return self._lazy_paginate(page, per_page, filter_by, error_out,
+                                   count, fetch, total)
+
+    def _fields(self):
+        return list(self.__model__._class_attrs)
+
+    def _key_field(self):
+        return self.__model__._rdn
+
+    def _iter_objects(self, batch_size):
+        return self.__model__.search(self.__ldap__)
+
+    def _lookup(self, record):
+        from ldapom_model import NoResultFound
+        rdn = self._key_field()
+        if rdn not in record:
+            return None
+        try:
+            return self.get(record[rdn])
+        except NoResultFound:
+            return None
+
+    def _ldif_attrs(self):
+        return {k: v.attr for k, v in self.__model__._class_attrs.items()}
+
+    def _ldif_header(self, record):
+        return [('dn', self._compute_dn(record)),
+                ('objectClass', self.__model__._class)]
+
 
 class LDAPOMCachedService(LDAPOMService):
 
@@ -392,13 +1066,115 @@ class Pagination(object):
 
     def iter_pages(self, left_edge=2, left_current=2,
                    right_current=5, right_edge=2):
-        last = 0
-        for num in range(1, self.pages + 1):
-            if num <= left_edge or \
-               (num > self.page - left_current - 1 and
-                num < self.page + right_current) or \
-               num > self.pages - right_edge:
-                if last + 1 != num:
-                    yield None
-                yield num
-                last = num
+        """
+            Yields the page numbers to display, and None for each gap.
+            Only the pages actually displayed are visited.
+        """
+        return _iter_pages(self.page, self.pages, left_edge, left_current,
+                           right_current, right_edge)
+
+
+class LazyPagination(Pagination):
+    """
+        A `Pagination` built from `per_page+1` fetched items, so that
+        `has_next` is known without counting. `total` calls `count()` the
+        first time it is accessed, or falls back to `estimate()`.
+    """
+
+    def __init__(self, page, per_page, items, count=None, estimate=None):
+        self.page = page
+        self.per_page = per_page
+        self.items = items[:per_page]
+        self._has_next = len(items) > per_page
+        self._count = count
+        self._estimate = estimate
+        self._total = None
+        self._approximate_total = None
+
+    @property
+    def _is_last(self):
+        """
+            True if the fetched page is known to be the last one.
+        """
+        return not self._has_next and (self.items or self.page == 1)
+
+    @property
+    def _known(self):
+        """
+            Minimum number of items, known from the fetched page. An empty
+            page proves nothing about the previous ones.
+        """
+        if not self.items:
+            return 0
+        return (self.page - 1) * self.per_page + len(self.items) + \
+            int(self._has_next)
+
+    @property
+    def total(self):
+        """
+            Exact number of items, or the approximate one if no count
+            function was given. None if neither is available.
+        """
+        if self._total is None:
+            if self._is_last:
+                self._total = self._known
+            elif self._count is not None:
+                self._total = self._count()
+            else:
+                return self.approximate_total
+        return self._total
+
+    @property
+    def approximate_total(self):
+        """
+            Approximate number of items, never lower than what is known to
+            exist. The exact total if it is already known.
+        """
+        if self._total is not None or self._is_last:
+            return self.total
+        if self._estimate is None:
+            return self.total if self._count is not None else None
+        if self._approximate_total is None:
+            self._approximate_total = max(self._estimate(), self._known)
+        return self._approximate_total
+
+    @property
+    def pages(self):
+        total = self.total
+        if total is None:
+            return None
+        return int(ceil(total / float(self.per_page)))
+
+    @property
+    def has_next(self):
+        """
+            True if a next page exists.
+        """
+        return self._has_next
+
+    def iter_pages(self, left_edge=2, left_current=2,
+                   right_current=5, right_edge=2):
+        """
+            Same as `Pagination.iter_pages()`. Without any total, the last
+            page displayed is the next one.
+        """
+        pages = self.pages
+        if pages is None:
+            pages = self.page + int(self._has_next)
+            right_edge = 0
+        return _iter_pages(self.page, pages, left_edge, left_current,
+                           right_current, right_edge)
+
+
+def _iter_pages(page, pages, left_edge, left_current, right_current,
+                right_edge):
+    last = 0
+    ranges = sorted([(1, left_edge),
+                     (page - left_current, page + right_current - 1),
+                     (pages - right_edge + 1, pages)])
+    for start, end in ranges:
+        for num in range(max(start, last + 1, 1), min(end, pages) + 1):
+            if last + 1 != num:
+                yield None
+            yield num
+            last = num
@@ -16,13 +16,14 @@ setup(
     description="Base classes to create a Service Layer in Flask.",
     long_description=read('README.md'),
     install_requires=['Flask'],
+    python_requires='>=3.7',
     include_package_data=True,
     url='http://github.com/sysnove/flask-servicelayer',
     classifiers=[
         "Programming Language :: Python",
         "Operating System :: OS Independent",
         "Intended Audience :: Developers",
-        "Programming Language :: Python :: 3.3",
+        "Programming Language :: Python :: 3.7",
     ],
     license="WTFPL",
 )
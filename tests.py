@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import datetime
+import io
+import os
+import tempfile
 import unittest
+from decimal import Decimal
 
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
 from ldapom import LDAPConnection
 from ldapom_model import LDAPModel, LDAPAttr
-from flask.ext.servicelayer import LDAPOMService
+from flask_servicelayer import LDAPOMService, SQLAlchemyService
+from flask_servicelayer import LazyPagination
+from flask_servicelayer import _FORMATS, _iter_pages
+from sqlalchemy import event
 import test_server
 
 import werkzeug
@@ -159,9 +169,430 @@ class TestLDAPModel(LDAPServerMixin, unittest.TestCase):
         with self.assertRaises(Exception):
             self.service.get("jack")
 
+    def test_export_import(self):
+        for format in ('jsonl', 'csv', 'ldif'):
+            stream = io.StringIO()
+            self.service.export(stream, format=format,
+                                fields=['cn', 'lastname'])
+            for person in self.service.all():
+                self.service.delete(person)
+            stream.seek(0)
+            report = self.service.import_(stream, format=format,
+                                          batch_size=3)
+            self.assertEqual(report.created, 4)
+            self.assertEqual(report.errors, [])
+            self.assertEqual(len(self.service.all()), 4)
+            self.assertEqual(self.service.get("sam").lastname, "Carter")
+
+    def test_import_conflict(self):
+        records = [{'cn': 'sam', 'lastname': 'Hammond'},
+                   {'cn': 'george', 'lastname': 'Hammond'}]
+        report = self.service.import_records(records)
+        self.assertEqual(report.created, 1)
+        self.assertEqual(len(report.errors), 1)
+        self.assertEqual(report.errors[0][0], 1)
+        report = self.service.import_records(records, on_conflict='skip')
+        self.assertEqual(report.skipped, 2)
+        self.assertEqual(self.service.get("sam").lastname, "Carter")
+        report = self.service.import_records(records, on_conflict='update')
+        self.assertEqual(report.updated, 2)
+        self.assertEqual(self.service.get("sam").lastname, "Hammond")
+        with self.assertRaises(ValueError):
+            self.service.import_records(records, on_conflict='replace')
+
+    def test_lazy_paginate(self):
+        pagination = self.service.lazy_paginate(page=1, per_page=3)
+        self.assertEqual(len(pagination.items), 3)
+        self.assertTrue(pagination.has_next)
+        self.assertEqual(pagination.total, 4)
+        self.assertEqual(list(pagination.iter_pages()), [1, 2])
+        pagination = self.service.lazy_paginate(page=2, per_page=3,
+                                                count=None)
+        self.assertEqual(len(pagination.items), 1)
+        self.assertFalse(pagination.has_next)
+        self.assertEqual(pagination.total, 4)
+        pagination = self.service.lazy_paginate(page=1, per_page=3,
+                                                count=None)
+        self.assertIsNone(pagination.total)
+        self.assertEqual(list(pagination.iter_pages()), [1, 2])
+        pagination = self.service.lazy_paginate(page=1, per_page=3,
+                                                count='approximate')
+        self.assertEqual(pagination.approximate_total, 4)
+        pagination = self.service.lazy_paginate(
+            page=1, per_page=10, filter_by={'lastname': 'Carter'})
+        self.assertEqual(pagination.total, 1)
+        with self.assertRaises(werkzeug.exceptions.NotFound):
+            self.service.lazy_paginate(page=3, per_page=3)
+
     def test_paginate(self):
         # :TODO:maethor:140604: 
         pass
 
+db = SQLAlchemy()
+
+
+class Product(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), unique=True, nullable=False)
+    released = db.Column(db.Date)
+    price = db.Column(db.Numeric(10, 2))
+
+
+class ProductService(SQLAlchemyService):
+    __model__ = Product
+    __db__ = db
+
+
+class NamedProductService(ProductService):
+
+    def _lookup(self, record):
+        return self.first(name=record.get('name'))
+
+
+class InitProductService(ProductService):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Archive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    price = db.Column(db.Numeric(10, 2))
+
+
+class ArchiveService(SQLAlchemyService):
+    __model__ = Archive
+    __db__ = db
+
+
+class SQLiteMixin(object):
+
+    """Mixin to set up a SQLite database file with working savepoints."""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = \
+            'sqlite:///' + self.db_path
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+        @event.listens_for(db.engine, 'connect')
+        def do_connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(db.engine, 'begin')
+        def do_begin(conn):
+            conn.exec_driver_sql('BEGIN')
+
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.ctx.pop()
+        os.remove(self.db_path)
+
+
+class TestSQLAlchemyImportExport(SQLiteMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = ProductService()
+        self.service.create(name="stargate", price=Decimal('9.99'),
+                            released=datetime.date(1994, 10, 28))
+        self.service.create(name="zpm")
+        self.service.create(name="naquadah", price=Decimal('100.00'))
+
+    def test_export_import(self):
+        for format in ('jsonl', 'csv', 'ldif'):
+            stream = io.StringIO()
+            self.service.export(stream, format=format, batch_size=1)
+            for product in self.service.all():
+                self.service.delete(product)
+            stream.seek(0)
+            report = self.service.import_(stream, format=format,
+                                          batch_size=2)
+            self.assertEqual(report.created, 3)
+            self.assertEqual(report.errors, [])
+            stargate = self.service.one(name="stargate")
+            self.assertEqual(stargate.released, datetime.date(1994, 10, 28))
+            self.assertEqual(stargate.price, Decimal('9.99'))
+            self.assertIsNone(self.service.one(name="zpm").price)
+
+    def test_export_import_records(self):
+        for i in range(4):
+            self.service.create(name="jumper%d" % i)
+        archives = ArchiveService()
+        report = archives.import_records(
+            self.service.export_records(fields=['id', 'name', 'price'],
+                                        batch_size=2),
+            batch_size=3)
+        self.assertEqual(report.created, 7)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(sorted(a.name for a in archives.all()),
+                         sorted(p.name for p in self.service.all()))
+        self.assertEqual(archives.one(name="stargate").price,
+                         Decimal('9.99'))
+
+    def test_import_invalid_records(self):
+        streams = {'jsonl': ('{"name": "jumper"}\nnot json\n3\n'
+                             '{"name": "dhd"}\n', 2, [2, 3]),
+                   'csv': ('name,price\njumper,1\n[draft] thing,2\n'
+                           '\\[y],\ndhd,3\n', 3, [2]),
+                   'ldif': ('dn: id=1\nname: jumper\n\n'
+                            'dn: id=2\nname:: a\n\n'
+                            'dn: id=3\nname: dhd\n', 2, [2])}
+        for format, (stream, created, errors) in streams.items():
+            for product in self.service.all():
+                self.service.delete(product)
+            report = self.service.import_(io.StringIO(stream), format=format,
+                                          batch_size=2)
+            self.assertEqual(report.created, created)
+            self.assertEqual([index for index, _, _ in report.errors], errors)
+            self.assertEqual([record for _, record, _ in report.errors],
+                             [None] * len(errors))
+            self.service.one(name="jumper")
+            self.service.one(name="dhd")
+
+    def test_import_custom_lookup(self):
+        service = NamedProductService()
+        records = [{'name': 'zpm', 'price': '1.50'}, {'name': 'jumper'}]
+        report = service.import_records(records, on_conflict='update')
+        self.assertEqual((report.created, report.updated), (1, 1))
+        self.assertEqual(service.one(name="zpm").price, Decimal('1.50'))
+        records = [{'name': 'zpm'}, {'name': None}, {'name': 'dhd'}]
+        report = service.import_records(records, on_conflict='skip')
+        self.assertEqual((report.created, report.skipped), (1, 1))
+        self.assertEqual([index for index, _, _ in report.errors], [2])
+        self.assertEqual(len(service.find(name="zpm")), 1)
+
+    def test_export_ldif_needs_key(self):
+        with self.assertRaises(ValueError):
+            self.service.export(io.StringIO(), format='ldif',
+                                fields=['name'])
+
+    def test_import_failing_record(self):
+        records = [{'name': 'jumper'}, {'name': 'zpm'}, {'name': 'dhd'}]
+        progress = []
+        report = self.service.import_records(
+            records, batch_size=2, progress=lambda r: progress.append(
+                (r.created, len(r.errors))))
+        self.assertEqual(progress, [(1, 1), (2, 1)])
+        self.assertEqual(report.errors[0][0], 2)
+        self.assertEqual(len(self.service.all()), 5)
+        self.service.one(name="jumper")
+        self.service.one(name="dhd")
+
+    def test_import_conflict(self):
+        zpm = self.service.one(name="zpm")
+        records = [{'id': str(zpm.id), 'name': 'zpm', 'price': '1.50'},
+                   {'id': '42', 'name': 'jumper'}]
+        report = self.service.import_records(records)
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.errors[0][0], 1)
+        report = self.service.import_records(records, on_conflict='skip')
+        self.assertEqual(report.skipped, 2)
+        report = self.service.import_records(records, on_conflict='update')
+        self.assertEqual(report.updated, 2)
+        self.assertEqual(self.service.get(zpm.id).price, Decimal('1.50'))
+        self.assertEqual(self.service.get(42).name, 'jumper')
+
+
+class TestSQLAlchemyLazyPaginate(SQLiteMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = ProductService()
+        for i in range(25):
+            self.service.create(name="product%02d" % i,
+                                price=Decimal(i % 2))
+
+    def test_lazy_paginate(self):
+        pagination = self.service.lazy_paginate(page=2, per_page=10)
+        self.assertEqual([p.name for p in pagination.items],
+                         ["product%02d" % i for i in range(10, 20)])
+        self.assertTrue(pagination.has_next)
+        self.assertEqual(pagination.total, 25)
+        self.assertEqual(pagination.pages, 3)
+        pagination = self.service.lazy_paginate(page=3, per_page=10,
+                                                count=None)
+        self.assertFalse(pagination.has_next)
+        self.assertEqual(pagination.total, 25)
+        pagination = self.service.lazy_paginate(page=1, per_page=10,
+                                                count=None)
+        self.assertIsNone(pagination.total)
+        self.assertEqual(list(pagination.iter_pages()), [1, 2])
+        with self.assertRaises(werkzeug.exceptions.NotFound):
+            self.service.lazy_paginate(page=4, per_page=10)
+        with self.assertRaises(ValueError):
+            self.service.lazy_paginate(count='exakt')
+
+    def test_lazy_paginate_approximate(self):
+        pagination = self.service.lazy_paginate(
+            per_page=5, filter_by={'price': 1}, count='approximate')
+        self.assertEqual(pagination.approximate_total, 12)
+        self.service.create(name="jumper", price=1)
+        pagination = self.service.lazy_paginate(
+            per_page=5, filter_by={'price': 1}, count='approximate')
+        self.assertEqual(pagination.approximate_total, 12)
+        pagination = self.service.lazy_paginate(
+            per_page=5, filter_by={'price': 0}, count='approximate')
+        self.assertEqual(pagination.approximate_total, 13)
+        self.service.__estimate_ttl__ = 0
+        pagination = self.service.lazy_paginate(
+            per_page=5, filter_by={'price': 1}, count='approximate')
+        self.assertEqual(pagination.approximate_total, 13)
+
+    def test_lazy_paginate_own_init(self):
+        service = InitProductService("products")
+        pagination = service.lazy_paginate(per_page=5, count='approximate')
+        self.assertEqual(pagination.approximate_total, 25)
+
+    def test_cached_estimate(self):
+        self.service.__estimate_cache_size__ = 2
+        calls = []
+
+        def estimate():
+            calls.append(1)
+            return len(calls)
+        for filter_by in ({'a': [1, 2]}, {'a': [1, 2]}, {'b': {1}},
+                          {'c': 1}, {'a': [1, 2]}):
+            self.service._cached_estimate(filter_by, estimate)()
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(len(self.service._estimate_cache), 2)
+        self.assertEqual(self.service._cached_estimate({'d': {}}, estimate)(),
+                         5)
+
+
+class TestPagination(unittest.TestCase):
+
+    def old_iter_pages(self, page, pages, left_edge, left_current,
+                       right_current, right_edge):
+        last = 0
+        for num in range(1, pages + 1):
+            if num <= left_edge or \
+               (num > page - left_current - 1 and
+                num < page + right_current) or \
+               num > pages - right_edge:
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
+
+    def test_iter_pages(self):
+        for pages in range(15):
+            for page in range(1, 16):
+                for edges in ((2, 2, 5, 2), (0, 0, 0, 0), (1, 3, 1, 3),
+                              (3, 0, 2, 1), (0, 2, 2, 0)):
+                    self.assertEqual(
+                        list(_iter_pages(page, pages, *edges)),
+                        list(self.old_iter_pages(page, pages, *edges)))
+
+    def test_lazy_total(self):
+        calls = []
+
+        def count():
+            calls.append(1)
+            return 1000
+        pagination = LazyPagination(3, 10, list(range(11)), count=count)
+        self.assertEqual(len(pagination.items), 10)
+        self.assertTrue(pagination.has_next)
+        self.assertEqual(calls, [])
+        self.assertEqual(pagination.total, 1000)
+        self.assertEqual(pagination.pages, 100)
+        self.assertEqual(list(pagination.iter_pages()),
+                         [1, 2, 3, 4, 5, 6, 7, None, 99, 100])
+        self.assertEqual(len(calls), 1)
+        pagination = LazyPagination(3, 10, list(range(4)), count=count)
+        self.assertFalse(pagination.has_next)
+        self.assertEqual(pagination.total, 24)
+        self.assertEqual(len(calls), 1)
+
+    def test_lazy_estimate(self):
+        pagination = LazyPagination(3, 10, list(range(11)),
+                                    estimate=lambda: 5)
+        self.assertEqual(pagination.approximate_total, 31)
+        self.assertEqual(pagination.total, 31)
+        pagination = LazyPagination(3, 10, list(range(11)),
+                                    estimate=lambda: 500)
+        self.assertEqual(pagination.pages, 50)
+        pagination = LazyPagination(3, 10, list(range(11)))
+        self.assertIsNone(pagination.total)
+        self.assertIsNone(pagination.pages)
+        self.assertEqual(list(pagination.iter_pages()), [1, 2, 3, 4])
+
+    def test_lazy_empty_page(self):
+        pagination = LazyPagination(5, 10, [], estimate=lambda: 3)
+        self.assertEqual(pagination.approximate_total, 3)
+        pagination = LazyPagination(5, 10, [], count=lambda: 30)
+        self.assertEqual(pagination.total, 30)
+        pagination = LazyPagination(5, 10, [])
+        self.assertIsNone(pagination.total)
+        self.assertEqual(list(pagination.iter_pages()),
+                         [1, 2, 3, 4, 5])
+
+
+class FormatService(object):
+
+    """Stands for a service in the format readers and writers."""
+
+    def _ldif_attrs(self):
+        return {'cn': 'cn', 'lastname': 'sn', 'photo': 'jpegPhoto'}
+
+    def _ldif_header(self, record):
+        return [('dn', 'cn=%s,dc=example,dc=com' % record['cn']),
+                ('objectClass', 'person')]
+
+
+class TestFormats(unittest.TestCase):
+
+    records = [{'cn': 'jack', 'lastname': "O'Niel",
+                'phone': ['4242424242', '0101010101'],
+                'description': 'line1\nline2'},
+               {'cn': 'sam', 'phone': ['123'], 'description': '[major]'},
+               {'cn': 'é ', 'description': '\\'}]
+
+    def roundtrip(self, format, records):
+        read, write = _FORMATS[format]
+        stream = io.StringIO()
+        fields = ['cn', 'lastname', 'phone', 'description', 'photo']
+        write(stream, iter(records), fields, FormatService())
+        stream.seek(0)
+        return list(read(stream, FormatService()))
+
+    def test_jsonl(self):
+        records = self.records + [{'cn': 'daniel', 'photo': b'\xff\x00'}]
+        self.assertEqual(self.roundtrip('jsonl', records), records)
+
+    def test_csv(self):
+        self.assertEqual(self.roundtrip('csv', self.records), self.records)
+        with self.assertRaises(ValueError):
+            self.roundtrip('csv', [{'cn': 'daniel', 'photo': b'\xff'}])
+
+    def test_ldif(self):
+        records = [{'cn': 'jack', 'lastname': "O'Niel",
+                    'phone': ['0101010101', '4242424242'],
+                    'description': 'line1\nline2', 'photo': b'\xff\x00'},
+                   {'cn': 'é '}]
+        self.assertEqual(self.roundtrip('ldif', records), records)
+
+    def test_read_ldif(self):
+        stream = io.StringIO("version: 1\n\n"
+                             "# jack\n"
+                             "DN: cn=jack,dc=example,dc=com\n"
+                             "objectclass: person\n"
+                             "cn: jack\n"
+                             "SN: O'Ni\n"
+                             " el\n")
+        self.assertEqual(list(_FORMATS['ldif'][0](stream, FormatService())),
+                         [{'cn': 'jack', 'lastname': "O'Niel"}])
+
+
 if __name__ == '__main__':
     unittest.main()